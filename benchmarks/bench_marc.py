@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Compare size and write time of MARCXML and binary MARC 21 output.
+
+Usage: python benchmarks/bench_marc.py [NUMBER_OF_RECORDS]
+"""
+import shutil
+import sys
+import tempfile
+from os import listdir
+from os.path import dirname, getsize, join, realpath
+from time import time
+
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from mapper import Mapper  # noqa
+
+
+def create_records(n):
+    """Return n synthetic LDAP records.
+
+    :param int n: number of records
+    """
+    return [{
+        "employeeID": [u"{0}".format(i)],
+        "givenName": [u"Jürgen"],
+        "sn": [u"Müller{0}".format(i)],
+        "displayName": [u"Jürgen Müller{0}".format(i)],
+        "telephoneNumber": [u"+41 22 76 {0:05d}".format(i)],
+        "mobile": [u"+41 75 411 {0:04d}".format(i % 10000)],
+        "mail": [u"juergen.mueller{0}@cern.ch".format(i)],
+        "department": [u"IT"],
+        "cernGroup": [u"CDA"],
+        "division": [u"IT"],
+        "cernInstituteName": [u"Université de Genève"]}
+        for i in range(n)]
+
+
+def measure(records, write, filename):
+    """Map records, write them, and return (seconds, bytes) of writing.
+
+    :param list records: LDAP records
+    :param string write: name of the Mapper write method
+    :param string filename: name of the output file
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        mapper = Mapper()
+        mapper.map_ldap_records(records)
+        start = time()
+        getattr(mapper, write)(join(directory, filename), 500)
+        seconds = time() - start
+        size = sum(getsize(join(directory, f)) for f in listdir(directory))
+        return seconds, size
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    """Print size and write time of both formats."""
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    records = create_records(n)
+
+    xml_seconds, xml_size = measure(records, "write_marcxml", "records.xml")
+    marc_seconds, marc_size = measure(records, "write_marc21", "records.mrc")
+
+    print("{0} records".format(n))
+    print("MARCXML:  {0:10d} bytes {1:8.3f}s".format(xml_size, xml_seconds))
+    print("MARC 21:  {0:10d} bytes {1:8.3f}s".format(
+        marc_size, marc_seconds))
+    print("MARCXML / MARC 21: size {0:.2f}x, time {1:.2f}x".format(
+        float(xml_size) / marc_size, xml_seconds / marc_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Measure the startup time of the ldap2marc.py subcommands.
+
+Each subcommand runs in a new interpreter until its modules are imported,
+i.e. until it would fetch the records from LDAP, where it exits. This is
+compared with the eager-import CLI of a baseline revision, which imports
+all modules before parsing its arguments ('--help'). The commands need
+python-ldap and lxml, otherwise they are reported as 'n/a'.
+
+Usage: python benchmarks/bench_startup.py [RUNS [BASELINE_REVISION]]
+[default: 10 runs, root commit]
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+from os.path import dirname, join, realpath
+from time import time
+
+ROOT = dirname(dirname(realpath(__file__)))
+
+# Run a subcommand, exiting when it starts to fetch the records
+RUN_SUBCOMMAND = """
+import sys
+sys.path.insert(0, {root!r})
+import ldap2marc
+
+
+def get_records(*args, **kwargs):
+    import myldap  # noqa, the import done by ldap2marc.get_records
+    sys.exit(0)
+
+ldap2marc.get_records = get_records
+ldap2marc.main({argv!r})
+"""
+
+SUBCOMMANDS = [
+    ["count"],
+    ["export", "-x", "records.xml"],
+    ["export", "-m", "records.mrc", "-x", "records.xml", "-j", "records.json"],
+    ["update", "records.json"]]
+
+
+def run(args, runs):
+    """Return the best wall time of running the interpreter with args.
+
+    :param list args: interpreter arguments
+    :param int runs: number of runs
+    :return: seconds, None if the command failed
+    """
+    best = None
+    for dummy in range(runs):
+        start = time()
+        if subprocess.call(
+                [sys.executable] + args, cwd=ROOT,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE) != 0:
+            return None
+        seconds = time() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def format_seconds(seconds):
+    """Format seconds, or 'n/a' for failed commands."""
+    return "n/a" if seconds is None else "{0:.3f}s".format(seconds)
+
+
+def main():
+    """Print the startup times of the subcommands and of the baseline."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    if len(sys.argv) > 2:
+        revision = sys.argv[2]
+    else:
+        # Root commit, with the original eager-import CLI
+        revision = subprocess.check_output(
+            ["git", "rev-list", "--max-parents=0", "HEAD"], cwd=ROOT).strip()
+
+    print("interpreter:                {0}".format(
+        format_seconds(run(["-c", "pass"], runs))))
+
+    for argv in SUBCOMMANDS:
+        seconds = run(
+            ["-c", RUN_SUBCOMMAND.format(root=ROOT, argv=argv)], runs)
+        print("{0:27s} {1}".format(" ".join(argv), format_seconds(seconds)))
+
+    directory = tempfile.mkdtemp()
+    try:
+        baseline = join(directory, "ldap2marc.py")
+        with open(baseline, "w") as f:
+            f.write(subprocess.check_output(
+                ["git", "show", "{0}:ldap2marc.py".format(revision)],
+                cwd=ROOT))
+        # Baseline script with the current modules
+        seconds = run(["-c", (
+            "import sys; sys.path.insert(0, {0!r}); "
+            "sys.argv = [{1!r}, '--help']; execfile({1!r})").format(
+                ROOT, baseline)], runs)
+        print("baseline {0} --help:  {1}".format(
+            revision[:7], format_seconds(seconds)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,19 @@
 # LDAP configuration
 CFG_CERN_LDAP_URI = "ldap://xldap.cern.ch:389"
+# Equivalent LDAP servers (replicas), the search is routed to the server
+# with the lowest latency and fails over to the next one
+CFG_CERN_LDAP_URIS = [CFG_CERN_LDAP_URI]
+# Seconds to wait for a server before failing over to the next one
+CFG_CERN_LDAP_TIMEOUT = 10
+# Seconds before a failed server is used again
+CFG_CERN_LDAP_RETRY_INTERVAL = 300
+# Filters splitting the search into partitions, which are fetched (and
+# retried on failover) independently and can be spread over the servers.
+# A catch-all partition for the records outside of these is added. Only
+# used with several servers or parallel fetching; if empty, one search is
+# done and repeated completely on failover
+CFG_CERN_LDAP_PARTITIONS = [
+    "(employeeID={0}*)".format(digit) for digit in range(10)]
 CFG_CERN_LDAP_BASE = "OU=Users,OU=Organic Units,DC=cern,DC=ch"
 CFG_CERN_LDAP_PAGESIZE = 250
 CFG_LDAP_SEARCHFILTER = r"(&(objectClass=*)(employeeType=Primary))"
@@ -29,5 +43,9 @@ CFG_RECORDS_JSON_FILE = "records.json"
 # Stores updated MARC 21 authority records
 CFG_RECORDS_UPDATED_FILE = "records_updates.xml"
 
+# Stores attribute-level changes of MARC 21 authority records (delta mode),
+# to be uploaded in correct mode
+CFG_RECORDS_DELTA_FILE = "records_updates_delta.xml"
+
 # Prefix used in MARC field 035__a
 CFG_AUTHOR_CERN = "AUTHOR|(SzGeCERN)"
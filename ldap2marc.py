@@ -1,17 +1,36 @@
+"""Command line interface for the CERN people collection.
+
+Heavy modules (python-ldap, lxml) are imported by the subcommands which
+need them, to keep the startup of short invocations fast.
+"""
 import argparse
 import sys
+from os import remove
+from os.path import isfile
+from time import time
 
 from config import (
-    CFG_LDAP_ATTRLIST, CFG_LDAP_SEARCHFILTER, CFG_RECORDS_JSON_FILE,
-    CFG_RECORDS_UPDATED_FILE)
-from myldap import get_users_records_data, LDAPError
-from mapper import Mapper, MapperError
-from utils import (
-    diff_records, export_json, get_data_from_json, UtilsError, version_file)
+    CFG_LDAP_ATTRLIST, CFG_LDAP_SEARCHFILTER, CFG_RECORDS_DELTA_FILE,
+    CFG_RECORDS_JSON_FILE, CFG_RECORDS_UPDATED_FILE)
+
+# Duration of the steps of a subcommand, tuples (label, seconds)
+_timings = []
+_last_mark = [time()]
+
+
+def _mark(label):
+    """Record the seconds elapsed since the previous mark as step label.
+
+    :param string label: name of the step which just finished
+    """
+    now = time()
+    _timings.append((label, now - _last_mark[0]))
+    _last_mark[0] = now
 
 
 def load_json(parser, json_file):
     """Return data from JSON file."""
+    from utils import get_data_from_json, UtilsError
     try:
         return get_data_from_json(json_file)
     except UtilsError as e:
@@ -19,128 +38,265 @@ def load_json(parser, json_file):
 
 
 def get_records(ldap_searchfilter=CFG_LDAP_SEARCHFILTER,
-                ldap_attrlist=CFG_LDAP_ATTRLIST):
-    """Return user records from LDAP."""
+                ldap_attrlist=CFG_LDAP_ATTRLIST, parallel=False):
+    """Return user records from LDAP.
+
+    The subcommands import their other modules before calling this, so the
+    import step ends here.
+    """
+    from myldap import get_users_records_data, LDAPError
+    _mark("imports")
+
     records = []
     try:
         records = get_users_records_data(
-            ldap_searchfilter, ldap_attrlist, "utf-8")
+            ldap_searchfilter, ldap_attrlist, "utf-8", parallel)
     except LDAPError as e:
-        sys.stderr.write(e)
+        sys.stderr.write("{0}\n".format(e))
         sys.exit(1)
     return records
 
 
-def update_records(json_file=CFG_RECORDS_JSON_FILE):
+def _is_delta_record(record, mapper):
+    """Check if an updated record can be uploaded as attribute-level delta.
+
+    Uploading in correct mode replaces all fields with the uploaded tags,
+    but keeps the other tags. New records and changed records which lost a
+    tag entirely need the full record.
+
+    :param tuple record: (status, record[, attr_keys]), see diff_records
+    :param Mapper mapper: mapper defining the MARC tags of the attributes
+    :return: True if record can be written as delta
+    """
+    if record[0] == "remove":
+        return True
+    if record[0] == "change":
+        return not mapper.get_lost_tags(record[1], record[2])
+    return False
+
+
+def update_records(json_file=CFG_RECORDS_JSON_FILE, delta=False,
+                   parallel=False):
     """Update local stored records with latest LDAP records.
 
     :param filepath json_file: path to JSON file containing records
+    :param bool delta: write changed and removed records as attribute-level
+        deltas to CFG_RECORDS_DELTA_FILE, and only the remaining full
+        records to CFG_RECORDS_UPDATED_FILE. A file without records is
+        removed, so no stale records of a previous run are uploaded
+    :param bool parallel: fetch the LDAP records in parallel
     """
+    from mapper import Mapper, MapperError
+    from utils import (
+        diff_records, export_json, get_data_from_json, UtilsError,
+        version_file)
+
     # Fetch CERN LDAP records
-    records_ldap = get_users_records_data(
-        CFG_LDAP_SEARCHFILTER,
-        CFG_LDAP_ATTRLIST,
-        "utf-8")
+    records_ldap = get_records(parallel=parallel)
+    print("{0} records fetched from CERN LDAP".format(len(records_ldap)))
     try:
         records_local = get_data_from_json(json_file)
         # records_diff contains updated records (changed, added, or
         # removed on LDAP)
-        records_diff = diff_records(records_ldap, records_local)
+        records_diff = diff_records(records_ldap, records_local, delta)
 
         # Map updated records
         if records_diff:
-            mapper = Mapper()
-            mapper.update_ldap_records(records_diff)
-            mapper.write_marcxml(CFG_RECORDS_UPDATED_FILE, 0)
+            records_delta = []
+            records_full = records_diff
+            if delta:
+                mapper = Mapper()
+                records_delta = [
+                    r for r in records_diff if _is_delta_record(r, mapper)]
+                records_full = [
+                    r for r in records_diff
+                    if not _is_delta_record(r, mapper)]
+
+            for records, xml_file, is_delta in (
+                    (records_delta, CFG_RECORDS_DELTA_FILE, True),
+                    (records_full, CFG_RECORDS_UPDATED_FILE, False)):
+                if records:
+                    mapper = Mapper()
+                    mapper.update_ldap_records(records, delta=is_delta)
+                    mapper.write_marcxml(xml_file, 0)
+                elif isfile(xml_file):
+                    # Remove the file of a previous run
+                    remove(xml_file)
             # Version existing file
             version_file(json_file)
             # Update local file with current LDAP records
             export_json(records_ldap, json_file)
         else:
             print "No updated records found."
-    except (UtilsError, MapperError) as e:
-        sys.stderr.write(e)
+    except (EnvironmentError, UtilsError, MapperError) as e:
+        sys.stderr.write("{0}\n".format(e))
         sys.exit(1)
 
 
-usage = ("bibauthority_people.py [-h] [[-r RECORDSIZE] [-x FILE [-l FILE] "
-         "[-j FILE]]] [-i FILE [FILE ...]] [-c]")
-
-parser = argparse.ArgumentParser(
-    description="Command line interface for the CERN people collection. Map "
-                "all CERN LDAP records to MARC 21 authority records, write "
-                "to XML files and upload to CDS.",
-    usage=usage)
-
-group1 = parser.add_argument_group("Export")
-group2 = parser.add_argument_group("Update")
-group3 = parser.add_argument_group("Information")
-
-group1.add_argument(
-    "-r",
-    "--recordsize",
-    dest="recordsize",
-    type=int,
-    default=500,
-    help="limit number of record elements for each XML file and has to be "
-         "used together with '-x' [default: %(default)d]. For unlimited "
-         "records use 0")
-group1.add_argument(
-    "-x",
-    "--exportxml",
-    dest="exportxml",
-    type=str,
-    metavar="FILE",
-    help="export mapped CERN LDAP records to XML FILE(s). Number of records "
-         "each FILE is based on RECORDSIZE")
-group1.add_argument(
-    "-j",
-    "--exportjson",
-    dest="exportjson",
-    type=str,
-    metavar="FILE",
-    help="export CERN LDAP records to a JSON-formatted FILE, recommended "
-         "using it together with '-x'")
-group2.add_argument(
-    "-u",
-    "--update",
-    dest="update",
-    type=str,
-    metavar="FILE",
-    help="check for updated records. Comapare FILE with latest LDAP records "
-         "[FILE=JSON file containg records, created with '-j']")
-group3.add_argument(
-    "-c",
-    "--count",
-    dest="count",
-    action="store_true",
-    help="count all primary CERN LDAP records")
-
-args = parser.parse_args()
-
-if args.exportxml or args.exportjson or args.update:
-    records = get_records()
+def count(args):
+    """Count all primary CERN LDAP records."""
+    records = get_records(
+        ldap_attrlist=['employeeID'], parallel=args.parallel)
+    print("{0} records found on CERN LDAP".format(len(records)))
+
+
+def export(args):
+    """Export mapped CERN LDAP records to MARCXML, MARC 21, and/or JSON."""
+    if not (args.exportxml or args.exportmarc or args.exportjson):
+        args.parser.error(
+            "at least one of '-x', '-m', or '-j' is required")
+
+    if args.exportxml or args.exportmarc:
+        from mapper import Mapper, MapperError
+    if args.exportjson:
+        from utils import export_json, UtilsError
+
+    records = get_records(parallel=args.parallel)
     print("{0} records fetched from CERN LDAP".format(len(records)))
 
-if args.exportxml:
-    try:
-        mapper = Mapper()
-        mapper.map_ldap_records(records)
-        mapper.write_marcxml(args.exportxml, args.recordsize)
-    except MapperError as e:
-        sys.stderr.write(e)
-        sys.exit(1)
+    if args.exportxml or args.exportmarc:
+        try:
+            mapper = Mapper()
+            mapper.map_ldap_records(records)
+            if args.exportmarc:
+                mapper.write_marc21(args.exportmarc, args.recordsize)
+            if args.exportxml:
+                mapper.write_marcxml(args.exportxml, args.recordsize)
+        except MapperError as e:
+            sys.stderr.write("{0}\n".format(e))
+            sys.exit(1)
 
-if args.exportjson:
-    try:
-        export_json(records, args.exportjson)
-    except UtilsError as e:
-        sys.stderr.write(e)
-        sys.exit(1)
+    if args.exportjson:
+        try:
+            export_json(records, args.exportjson)
+        except UtilsError as e:
+            sys.stderr.write("{0}\n".format(e))
+            sys.exit(1)
 
-if args.update:
-    update_records(args.update)
 
-if args.count:
-    records = get_records(ldap_attrlist=['employeeID'])
-    print("{0} records found on CERN LDAP".format(len(records)))
+def update(args):
+    """Check for updated records and map them."""
+    update_records(args.file, args.delta, args.parallel)
+
+
+def _create_parser():
+    """Create the argument parser with the subcommands.
+
+    :return: argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description="Command line interface for the CERN people collection. "
+                    "Map all CERN LDAP records to MARC 21 authority records, "
+                    "write to XML files and upload to CDS.")
+
+    # Options of all subcommands
+    parent = argparse.ArgumentParser(add_help=False)
+    parent.add_argument(
+        "-p",
+        "--parallel",
+        dest="parallel",
+        action="store_true",
+        help="fetch the search partitions (CFG_CERN_LDAP_PARTITIONS) in "
+             "parallel, spread over the LDAP servers (CFG_CERN_LDAP_URIS)")
+    parent.add_argument(
+        "-t",
+        "--timing",
+        dest="timing",
+        action="store_true",
+        help="print the time spent parsing the arguments, importing the "
+             "modules, and running the subcommand to stderr")
+
+    subparsers = parser.add_subparsers(title="subcommands", dest="command")
+
+    parser_count = subparsers.add_parser(
+        "count",
+        parents=[parent],
+        help="count all primary CERN LDAP records")
+    parser_count.set_defaults(func=count)
+
+    parser_export = subparsers.add_parser(
+        "export",
+        parents=[parent],
+        help="export mapped CERN LDAP records")
+    parser_export.add_argument(
+        "-r",
+        "--recordsize",
+        dest="recordsize",
+        type=int,
+        default=500,
+        help="limit number of record elements for each XML or MARC file and "
+             "has to be used together with '-x' or '-m' [default: "
+             "%(default)d]. For unlimited records use 0")
+    parser_export.add_argument(
+        "-x",
+        "--exportxml",
+        dest="exportxml",
+        type=str,
+        metavar="FILE",
+        help="export mapped CERN LDAP records to XML FILE(s). Number of "
+             "records each FILE is based on RECORDSIZE")
+    parser_export.add_argument(
+        "-m",
+        "--exportmarc",
+        dest="exportmarc",
+        type=str,
+        metavar="FILE",
+        help="export mapped CERN LDAP records to binary MARC 21 (ISO 2709) "
+             "FILE(s). Number of records each FILE is based on RECORDSIZE")
+    parser_export.add_argument(
+        "-j",
+        "--exportjson",
+        dest="exportjson",
+        type=str,
+        metavar="FILE",
+        help="export CERN LDAP records to a JSON-formatted FILE, "
+             "recommended using it together with '-x'")
+    parser_export.set_defaults(func=export, parser=parser_export)
+
+    parser_update = subparsers.add_parser(
+        "update",
+        parents=[parent],
+        help="check for updated records. Compare FILE with latest LDAP "
+             "records")
+    parser_update.add_argument(
+        "file",
+        type=str,
+        metavar="FILE",
+        help="JSON file containing records, created with 'export -j'")
+    parser_update.add_argument(
+        "-d",
+        "--delta",
+        dest="delta",
+        action="store_true",
+        help="write changed and removed records as attribute-level deltas "
+             "to '{0}' (upload in correct mode). New records and changed "
+             "records which lost a MARC tag entirely are written in full to "
+             "'{1}' (upload in replace or insert mode). A file without "
+             "records is removed".format(
+                 CFG_RECORDS_DELTA_FILE, CFG_RECORDS_UPDATED_FILE))
+    parser_update.set_defaults(func=update)
+
+    return parser
+
+
+def main(argv=None):
+    """Run the subcommand given in argv.
+
+    :param list argv: command line arguments [default: sys.argv[1:]]
+    """
+    args = _create_parser().parse_args(argv)
+    _mark("parse")
+
+    args.func(args)
+    _mark("run")
+
+    if args.timing:
+        sys.stderr.write("{0}: {1}, total {2:.3f}s\n".format(
+            args.command,
+            ", ".join("{0} {1:.3f}s".format(label, seconds)
+                      for label, seconds in _timings),
+            sum(seconds for dummy, seconds in _timings)))
+
+
+if __name__ == "__main__":
+    main()
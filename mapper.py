@@ -5,6 +5,11 @@ from lxml import etree
 from os import makedirs
 from os.path import dirname, exists, splitext
 
+# ISO 2709 (binary MARC 21) delimiters
+_SUBFIELD_DELIMITER = "\x1f"
+_FIELD_TERMINATOR = "\x1e"
+_RECORD_TERMINATOR = "\x1d"
+
 
 class MapperError(Exception):
 
@@ -15,7 +20,7 @@ class MapperError(Exception):
 
 class Mapper:
 
-    """Map CERN LDAP records to MARC 21 authority records (MARCXML).
+    """Map CERN LDAP records to MARC 21 authority records (MARCXML, ISO 2709).
 
     MARC 21 authority reference: http://www.loc.gov/marc/authority/
     """
@@ -237,15 +242,75 @@ class Mapper:
 
         return self.records
 
-    def update_ldap_records(self, records):
+    def get_lost_tags(self, record, attr_keys):
+        """Return the tags which disappear entirely from a changed record.
+
+        A tag is lost if an attribute mapped to it was removed and no other
+        datafield with this tag remains in the mapped record.
+
+        :param dictionary record: current LDAP record (result-data)
+        :param list attr_keys: changed LDAP attributes
+        :return: set of MARC tags
+        """
+        tags = set(
+            elem_datafield.get("tag")
+            for elem_datafield in self.map_ldap_record(record).xpath(
+                "datafield"))
+
+        lost_tags = set()
+        for attr_key in attr_keys:
+            marc_id = self.mapper_dict.get(attr_key)
+            if marc_id and not record.get(attr_key):
+                tag = self._split_marc_id(marc_id)[0]
+                if tag not in tags:
+                    lost_tags.add(tag)
+
+        return lost_tags
+
+    def map_ldap_record_delta(self, record, attr_keys):
+        """Map only the datafields affected by the given LDAP attributes.
+
+        The record contains the identifier (035__a) and every datafield whose
+        tag is mapped from one of attr_keys. Datafields are kept complete,
+        since uploading in correct mode replaces all fields with the same tag.
+        Tags which are not uploaded are kept, so a tag lost entirely (see
+        get_lost_tags) cannot be removed with a delta record.
+
+        :param dictionary record: LDAP record (result-data)
+        :param list attr_keys: changed LDAP attributes
+        :return: record element
+        """
+        tags = set(["035"])
+        for attr_key in attr_keys:
+            marc_id = self.mapper_dict.get(attr_key)
+            if marc_id:
+                tags.add(self._split_marc_id(marc_id)[0])
+
+        elem_record = self.map_ldap_record(record)
+        for elem_datafield in elem_record.xpath("datafield"):
+            if elem_datafield.get("tag") not in tags:
+                elem_record.remove(elem_datafield)
+
+        return elem_record
+
+    def update_ldap_records(self, records, delta=False):
         """Map updated LDAP records.
 
         :param list records: list of tuples (status, record), where status is
-            'add', 'remove', or 'change'
+            'add', 'remove', or 'change'. If delta, tuples with status
+            'change' contain the list of changed attributes as third element
+        :param bool delta: map changed records to their changed datafields
+            and removed records to the identifier only, instead of mapping
+            the full records
         :return: list of record XML elements
         """
         for record in records:
-            r = self.map_ldap_record(record[1])
+            if delta and record[0] == "change":
+                r = self.map_ldap_record_delta(record[1], record[2])
+            elif delta and record[0] == "remove":
+                r = self.map_ldap_record_delta(record[1], [])
+            else:
+                r = self.map_ldap_record(record[1])
 
             # Add datafields for removed records
             if record[0] is "remove":
@@ -305,3 +370,99 @@ class Mapper:
                         f)
         except MapperError:
             raise
+
+    def _encode(self, text):
+        """Encode text of an element to UTF-8.
+
+        :param string text: text of an element, can be None
+        :return: encoded string
+        """
+        if text is None:
+            return ""
+        if isinstance(text, unicode):
+            return text.encode("utf-8")
+        return text
+
+    def _record_to_iso2709(self, elem_record):
+        """Serialize record element to a binary MARC 21 record (ISO 2709).
+
+        Lengths and positions in leader and directory count the bytes of
+        the UTF-8 encoded fields.
+
+        :param elem elem_record: record element
+        :return: encoded record
+        """
+        directory = []
+        fields = []
+        offset = 0
+
+        # Control fields (00X) sort before data fields
+        for elem_field in sorted(elem_record, key=lambda e: e.get("tag")):
+            tag = elem_field.get("tag")
+            if elem_field.tag == "controlfield":
+                field = self._encode(elem_field.text)
+            else:
+                parts = [elem_field.get("ind1"), elem_field.get("ind2")]
+                for elem_subfield in elem_field:
+                    parts.append(_SUBFIELD_DELIMITER)
+                    parts.append(elem_subfield.get("code"))
+                    parts.append(self._encode(elem_subfield.text))
+                field = "".join(parts)
+            field += _FIELD_TERMINATOR
+
+            if len(field) > 9999:
+                raise MapperError(
+                    "Error: field {0} exceeds 9999 bytes.".format(tag))
+            directory.append("{0}{1:04d}{2:05d}".format(
+                tag, len(field), offset))
+            fields.append(field)
+            offset += len(field)
+
+        base_address = 24 + 12 * len(directory) + 1
+        record_length = base_address + offset + 1
+        if record_length > 99999:
+            raise MapperError("Error: record exceeds 99999 bytes.")
+
+        # Leader: new ('n') authority ('z') record in UCS ('a'), complete
+        # encoding level ('n')
+        leader = "{0:05d}nz  a22{1:05d}n  4500".format(
+            record_length, base_address)
+
+        return "{0}{1}{2}{3}{4}".format(
+            leader, "".join(directory), _FIELD_TERMINATOR, "".join(fields),
+            _RECORD_TERMINATOR)
+
+    def write_marc21(self, marc_file, record_size=500):
+        """Write self.records as binary MARC 21 (ISO 2709) to file(s).
+
+        Records are serialized and written one by one.
+
+        :param filepath marc_file: save to file,
+            suffix ('_0', '_1', ...) will be added to file name
+        :param int record_size: records in a file [default: 500],
+            if <= 0: write all records to one file
+        """
+        directory = dirname(marc_file)
+        if directory and not exists(directory):
+            makedirs(directory)
+
+        # Write single file
+        if record_size <= 0:
+            chunks = [(marc_file, self.records)]
+        # Write multiple files
+        else:
+            filename, ext = splitext(marc_file)
+            chunks = [
+                ("{0}_{1}{2}".format(filename, i, ext),
+                 self.records[j:j + record_size])
+                for i, j in enumerate(
+                    range(0, len(self.records), record_size))]
+
+        for f, records in chunks:
+            try:
+                with open(f, "wb") as fh:
+                    for record in records:
+                        fh.write(self._record_to_iso2709(record))
+            except EnvironmentError as e:
+                raise MapperError(
+                    "Error: failed writing file. ({0})".format(e))
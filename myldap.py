@@ -1,7 +1,24 @@
 import ldap
+from collections import OrderedDict
 from ldap.controls import SimplePagedResultsControl
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from time import time
 from config import (
-    CFG_CERN_LDAP_PAGESIZE, CFG_CERN_LDAP_URI, CFG_CERN_LDAP_BASE)
+    CFG_CERN_LDAP_BASE, CFG_CERN_LDAP_PAGESIZE, CFG_CERN_LDAP_PARTITIONS,
+    CFG_CERN_LDAP_RETRY_INTERVAL, CFG_CERN_LDAP_TIMEOUT, CFG_CERN_LDAP_URI,
+    CFG_CERN_LDAP_URIS)
+
+# Health of the LDAP servers: latency of a root DSE read (seconds, None if
+# unknown) and timestamp until a failed server is skipped
+_servers = OrderedDict(
+    (uri, {"latency": None, "down_until": 0}) for uri in CFG_CERN_LDAP_URIS)
+_servers_lock = Lock()
+
+# Errors on which the search fails over to the next server
+_SERVER_ERRORS = (
+    ldap.SERVER_DOWN, ldap.TIMEOUT, ldap.CONNECT_ERROR, ldap.UNAVAILABLE,
+    ldap.BUSY)
 
 
 class LDAPError(Exception):
@@ -11,20 +28,136 @@ class LDAPError(Exception):
     pass
 
 
-def _ldap_initialize():
+def _ldap_initialize(uri=CFG_CERN_LDAP_URI):
     """Initialize the LDAP connection.
 
+    :param string uri: LDAP server to connect to
     :return: LDAP connection
     """
     try:
-        ldap_connection = ldap.initialize(CFG_CERN_LDAP_URI)
+        ldap_connection = ldap.initialize(uri)
         ldap_connection.set_option(ldap.OPT_PROTOCOL_VERSION, 3)
         ldap_connection.set_option(ldap.OPT_REFERRALS, 0)
+        ldap_connection.set_option(
+            ldap.OPT_NETWORK_TIMEOUT, CFG_CERN_LDAP_TIMEOUT)
+        ldap_connection.set_option(ldap.OPT_TIMEOUT, CFG_CERN_LDAP_TIMEOUT)
         return ldap_connection
     except ldap.LDAPError as e:
         raise LDAPError("Initialization failed: {0}.".format(e))
 
 
+def _get_server(uri):
+    """Return the health entry of a server, created if missing.
+
+    Has to be called while holding _servers_lock.
+
+    :param string uri: LDAP server
+    :return: dictionary with latency and down_until
+    """
+    return _servers.setdefault(uri, {"latency": None, "down_until": 0})
+
+
+def _mark_latency(uri, latency):
+    """Update the latency of a server (moving average).
+
+    :param string uri: LDAP server
+    :param float latency: measured seconds of a root DSE read
+    """
+    with _servers_lock:
+        server = _get_server(uri)
+        if server["latency"] is None:
+            server["latency"] = latency
+        else:
+            server["latency"] = 0.7 * server["latency"] + 0.3 * latency
+        server["down_until"] = 0
+
+
+def _mark_down(uri):
+    """Skip a failed server for CFG_CERN_LDAP_RETRY_INTERVAL seconds.
+
+    :param string uri: LDAP server
+    """
+    with _servers_lock:
+        server = _get_server(uri)
+        server["latency"] = None
+        server["down_until"] = time() + CFG_CERN_LDAP_RETRY_INTERVAL
+
+
+def _is_down(uri):
+    """Check if a server failed within CFG_CERN_LDAP_RETRY_INTERVAL.
+
+    :param string uri: LDAP server
+    :return: True if the server is skipped
+    """
+    with _servers_lock:
+        return _get_server(uri)["down_until"] > time()
+
+
+def _ranked_uris():
+    """Rank the servers by health and latency.
+
+    Available servers come first, the ones with the lowest latency first
+    (unknown latency is ranked first to get measured), followed by the
+    failed servers as last resort.
+
+    :return: list of server URIs
+    """
+    now = time()
+    with _servers_lock:
+        servers = [(uri, dict(server)) for uri, server in _servers.items()]
+    up = [(uri, s) for uri, s in servers if s["down_until"] <= now]
+    down = [(uri, s) for uri, s in servers if s["down_until"] > now]
+    up.sort(key=lambda x: x[1]["latency"] or 0)
+    down.sort(key=lambda x: x[1]["down_until"])
+    return [uri for uri, dummy in up + down]
+
+
+def _probe_server(uri):
+    """Measure the latency of a server by reading the root DSE.
+
+    Any error of the server marks it down, so a failing replica does not
+    abort the run while another one is healthy.
+
+    :param string uri: LDAP server
+    """
+    try:
+        ldap_connection = _ldap_initialize(uri)
+    except LDAPError:
+        _mark_down(uri)
+        return
+
+    try:
+        start = time()
+        ldap_connection.search_s(
+            "", ldap.SCOPE_BASE, "(objectClass=*)", ["1.1"])
+        _mark_latency(uri, time() - start)
+    except ldap.LDAPError:
+        _mark_down(uri)
+    finally:
+        try:
+            ldap_connection.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+
+def _probe_servers():
+    """Measure the latency of all available servers in parallel.
+
+    Servers which failed within CFG_CERN_LDAP_RETRY_INTERVAL are skipped,
+    so a dead server does not delay every run by CFG_CERN_LDAP_TIMEOUT.
+    """
+    uris = [uri for uri in _servers.keys() if not _is_down(uri)]
+    if not uris:
+        return
+
+    pool = ThreadPool(len(uris))
+    try:
+        pool.map(_probe_server, uris)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def _msgid(ldap_connection, req_ctrl, ldap_searchfilter, ldap_attrlist=None):
     """Run the search request using search_ext.
 
@@ -83,18 +216,121 @@ def _paged_search(ldap_connection, ldap_searchfilter, ldap_attrlist=None):
     return results
 
 
+def _failover_search(ldap_searchfilter, ldap_attrlist=None, uris=None):
+    """Search the servers in the given order until one succeeds.
+
+    Servers which failed in the meantime are tried last. A paged search
+    cannot be resumed on another server, so a failed search is repeated
+    from the start on the next server.
+
+    :param string ldap_searchfilter: filter to apply in the LDAP search
+    :param list ldap_attrlist: retrieved LDAP attributes. If None, all
+        attributes are returned
+    :param list uris: servers to try [default: ranking of _ranked_uris]
+    :return: list of tuples (result-type, result-data) or empty list
+    """
+    uris = uris or _ranked_uris()
+    uris = ([uri for uri in uris if not _is_down(uri)] +
+            [uri for uri in uris if _is_down(uri)])
+    errors = []
+
+    for uri in uris:
+        try:
+            ldap_connection = _ldap_initialize(uri)
+            results = _paged_search(
+                ldap_connection, ldap_searchfilter, ldap_attrlist)
+            ldap_connection.unbind_s()
+            return results
+        except _SERVER_ERRORS + (LDAPError,) as e:
+            _mark_down(uri)
+            errors.append("{0}: {1}".format(uri, e))
+
+    raise LDAPError("Error: Connection to CERN LDAP failed. ({0})"
+                    .format("; ".join(errors)))
+
+
+def _partition_filters(ldap_searchfilter, partitions=None):
+    """Split the search filter by the partitions.
+
+    A catch-all partition matching the records outside of all given
+    partitions is added, so the partitions always cover every record.
+
+    :param string ldap_searchfilter: filter to apply in the LDAP search
+    :param list partitions: partition filters
+        [default: CFG_CERN_LDAP_PARTITIONS]
+    :return: list of search filters
+    """
+    if partitions is None:
+        partitions = CFG_CERN_LDAP_PARTITIONS
+    if not partitions:
+        return [ldap_searchfilter]
+
+    partitions = list(partitions) + [
+        "(!(|{0}))".format("".join(partitions))]
+    return ["(&{0}{1})".format(ldap_searchfilter, p) for p in partitions]
+
+
+def _partitioned_search(ldap_searchfilter, ldap_attrlist=None,
+                        parallel=False):
+    """Search each partition of CFG_CERN_LDAP_PARTITIONS separately.
+
+    Every partition fails over on its own, so fetched partitions are kept
+    if a server goes down during the run. The servers are ranked once; in
+    parallel mode each partition starts on a different server of the
+    ranking. With a single server and without parallel, there is nothing
+    to fail over to or spread over, so one search is done.
+
+    :param string ldap_searchfilter: filter to apply in the LDAP search
+    :param list ldap_attrlist: retrieved LDAP attributes. If None, all
+        attributes are returned
+    :param bool parallel: search the partitions in parallel, spread over
+        the servers
+    :return: list of tuples (result-type, result-data) or empty list
+    """
+    if len(_servers) > 1 or parallel:
+        filters = _partition_filters(ldap_searchfilter)
+    else:
+        filters = [ldap_searchfilter]
+    uris = _ranked_uris()
+
+    if parallel and len(filters) > 1:
+        searches = [
+            (f, uris[i % len(uris):] + uris[:i % len(uris)])
+            for i, f in enumerate(filters)]
+        pool = ThreadPool(min(len(filters), len(uris)))
+        try:
+            results = pool.map(
+                lambda x: _failover_search(x[0], ldap_attrlist, x[1]),
+                searches)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_failover_search(f, ldap_attrlist, uris) for f in filters]
+
+    # Drop duplicates of overlapping partitions
+    records = OrderedDict()
+    for result in results:
+        for dn, x in result:
+            records.setdefault(dn, (dn, x))
+    return records.values()
+
+
 def get_users_records_data(
-  ldap_searchfilter, attr_list=None, decode_encoding=None):
+  ldap_searchfilter, attr_list=None, decode_encoding=None, parallel=False):
     """Get result-data of records.
 
     :param string ldap_searchfilter: filter to apply in the LDAP search
     :param list attr_list: retrieved LDAP attributes. If None, all attributes
         are returned
     :param string decode_encoding: decode the values of the LDAP records
+    :param bool parallel: search the partitions in parallel, spread over the
+        servers of CFG_CERN_LDAP_URIS
     :return: list of LDAP records, but result-data only
     """
-    ldap_connection = _ldap_initialize()
-    records = _paged_search(ldap_connection, ldap_searchfilter, attr_list)
+    if len(_servers) > 1:
+        _probe_servers()
+    records = _partitioned_search(ldap_searchfilter, attr_list, parallel)
 
     records_data = []
 
@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+import unittest
+from os.path import isfile, join
+
+import mock
+
+import ldap2marc
+from mapper import Mapper
+from utils import export_json
+
+RECORD = {
+    "employeeID": [u"123456"],
+    "givenName": [u"John"],
+    "sn": [u"Doe"],
+    "displayName": [u"John Doe"],
+    "telephoneNumber": [u"71234"],
+    "mobile": [u"4111234"]}
+
+
+class TestDeltaRecords(unittest.TestCase):
+
+    """Test routing updated records to the delta or the full file."""
+
+    def setUp(self):
+        self.mapper = Mapper()
+
+    def test_changed_attribute(self):
+        """Changed records are written as delta."""
+        self.assertTrue(ldap2marc._is_delta_record(
+            ("change", RECORD, ["telephoneNumber"]), self.mapper))
+
+    def test_lost_attribute(self):
+        """Records which lost an attribute of a remaining tag are deltas."""
+        record = dict(RECORD)
+        del record["mobile"]
+
+        self.assertTrue(ldap2marc._is_delta_record(
+            ("change", record, ["mobile"]), self.mapper))
+
+    def test_lost_tag(self):
+        """Records which lost a tag entirely are written in full."""
+        record = dict(RECORD)
+        for attr_key in ["givenName", "sn", "displayName"]:
+            del record[attr_key]
+
+        self.assertFalse(ldap2marc._is_delta_record(
+            ("change", record, ["displayName", "givenName", "sn"]),
+            self.mapper))
+
+    def test_new_and_removed(self):
+        """New records are written in full, removed ones as delta."""
+        self.assertFalse(ldap2marc._is_delta_record(
+            ("add", RECORD), self.mapper))
+        self.assertTrue(ldap2marc._is_delta_record(
+            ("remove", RECORD), self.mapper))
+
+
+class TestUpdateRecords(unittest.TestCase):
+
+    """Test writing the update files."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.json_file = join(self.directory, "records.json")
+        self.delta_file = join(self.directory, "delta.xml")
+        self.full_file = join(self.directory, "full.xml")
+
+        patches = [
+            mock.patch.object(
+                ldap2marc, "CFG_RECORDS_DELTA_FILE", self.delta_file),
+            mock.patch.object(
+                ldap2marc, "CFG_RECORDS_UPDATED_FILE", self.full_file)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_stale_file_removed(self):
+        """The full file of a previous run is removed if not regenerated."""
+        with open(self.full_file, "w") as f:
+            f.write("previous run")
+        export_json([RECORD], self.json_file)
+        record = dict(RECORD, telephoneNumber=[u"75678"])
+
+        with mock.patch.object(
+                ldap2marc, "get_records", return_value=[record]):
+            ldap2marc.update_records(self.json_file, delta=True)
+
+        self.assertTrue(isfile(self.delta_file))
+        self.assertFalse(isfile(self.full_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
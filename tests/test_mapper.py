@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+from config import CFG_AUTHOR_CERN
+from mapper import Mapper
+
+RECORD = {
+    "employeeID": [u"123456"],
+    "givenName": [u"Jürgen"],
+    "sn": [u"Müller"],
+    "displayName": [u"Jürgen Müller"],
+    "telephoneNumber": [u"+41 22 76 71234"],
+    "mail": [u"juergen.mueller@cern.ch"],
+    "department": [u"IT"],
+    "cernInstituteName": [u"Université de Genève"]}
+
+
+def parse_iso2709(data):
+    """Parse binary MARC 21 records.
+
+    :param string data: ISO 2709 encoded records
+    :return: list of tuples (leader, fields), where fields is a list of
+        tuples (tag, ind1, ind2, [(code, value), ...])
+    """
+    records = []
+    while data:
+        leader = data[:24]
+        record_length = int(leader[:5])
+        base_address = int(leader[12:17])
+        record, data = data[:record_length], data[record_length:]
+        assert record.endswith("\x1d")
+
+        directory = record[24:base_address - 1]
+        assert record[base_address - 1] == "\x1e"
+        fields = []
+        for i in range(0, len(directory), 12):
+            tag = directory[i:i + 3]
+            length = int(directory[i + 3:i + 7])
+            start = base_address + int(directory[i + 7:i + 12])
+            field = record[start:start + length]
+            assert field.endswith("\x1e")
+            subfields = [
+                (s[0], s[1:].decode("utf-8"))
+                for s in field[2:-1].split("\x1f")[1:]]
+            fields.append((tag, field[0], field[1], subfields))
+        records.append((leader, fields))
+    return records
+
+
+class TestMarc21(unittest.TestCase):
+
+    """Test writing binary MARC 21 (ISO 2709) records."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _read(self, filename):
+        with open(join(self.directory, filename), "rb") as f:
+            return f.read()
+
+    def test_round_trip(self):
+        """Written records contain every mapped LDAP attribute."""
+        mapper = Mapper()
+        mapper.map_ldap_records([RECORD])
+        mapper.write_marc21(join(self.directory, "records.mrc"), 0)
+
+        records = parse_iso2709(self._read("records.mrc"))
+        self.assertEqual(len(records), 1)
+        leader, fields = records[0]
+        self.assertEqual(leader[5:12], "nz  a22")
+        self.assertEqual(leader[17:], "n  4500")
+
+        values = {}
+        for tag, ind1, ind2, subfields in fields:
+            ind1 = ind1.replace(" ", "_")
+            ind2 = ind2.replace(" ", "_")
+            for code, value in subfields:
+                values.setdefault(tag + ind1 + ind2 + code, []).append(value)
+
+        for attr_key, value in RECORD.items():
+            expected = value[0]
+            if attr_key == "employeeID":
+                expected = CFG_AUTHOR_CERN + expected
+            self.assertIn(expected, values[mapper.mapper_dict[attr_key]])
+        self.assertEqual(values["980__a"], ["PEOPLE", "AUTHORITY"])
+
+        # Fields are ordered by tag
+        tags = [tag for tag, dummy, dummy, dummy in fields]
+        self.assertEqual(tags, sorted(tags))
+
+    def test_record_size(self):
+        """Records are split into files of record_size records."""
+        records = []
+        for i in range(5):
+            record = dict(RECORD)
+            record["employeeID"] = [u"{0}".format(i)]
+            records.append(record)
+
+        mapper = Mapper()
+        mapper.map_ldap_records(records)
+        mapper.write_marc21(join(self.directory, "records.mrc"), 2)
+
+        counts = [
+            len(parse_iso2709(self._read("records_{0}.mrc".format(i))))
+            for i in range(3)]
+        self.assertEqual(counts, [2, 2, 1])
+
+
+class TestDelta(unittest.TestCase):
+
+    """Test mapping updated records to attribute-level deltas."""
+
+    def _fields(self, elem_record):
+        """Return the datafields of a record as (tag, ind1, ind2, codes)."""
+        return sorted(
+            (e.get("tag"), e.get("ind1"), e.get("ind2"),
+             tuple(s.get("code") for s in e))
+            for e in elem_record.xpath("datafield"))
+
+    def test_changed_telephone_number(self):
+        """Only 035 and the complete 371 field are written."""
+        mapper = Mapper()
+        elem_record = mapper.map_ldap_record_delta(
+            RECORD, ["telephoneNumber"])
+
+        fields = self._fields(elem_record)
+        self.assertEqual([f[0] for f in fields], ["035", "371"])
+        self.assertEqual(
+            sorted(fields[1][3]), sorted(["0", "d", "k", "m", "v"]))
+
+    def test_changed_given_name(self):
+        """All three 100 fields are written."""
+        mapper = Mapper()
+        elem_record = mapper.map_ldap_record_delta(RECORD, ["givenName"])
+
+        fields = self._fields(elem_record)
+        self.assertEqual(
+            [f[:3] for f in fields],
+            [("035", " ", " "), ("100", " ", " "), ("100", "0", " "),
+             ("100", "1", " ")])
+
+    def test_removed_record(self):
+        """Removed records contain only 035 and 595."""
+        mapper = Mapper()
+        records = mapper.update_ldap_records(
+            [("remove", RECORD)], delta=True)
+
+        fields = self._fields(records[0])
+        self.assertEqual(
+            [f[0] for f in fields], ["035", "595", "595"])
+
+    def test_changed_record_full(self):
+        """Without delta, changed records are mapped completely."""
+        mapper = Mapper()
+        records = mapper.update_ldap_records(
+            [("change", RECORD, ["telephoneNumber"])])
+
+        self.assertEqual(
+            self._fields(records[0]),
+            self._fields(mapper.map_ldap_record(RECORD)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+import unittest
+from collections import OrderedDict
+
+import ldap
+import mock
+from ldap.controls import SimplePagedResultsControl
+
+import myldap
+
+URI_A = "ldap://replica-a:389"
+URI_B = "ldap://replica-b:389"
+
+RECORDS = [
+    ("CN=user{0},OU=Users".format(i), {"employeeID": [str(i)]})
+    for i in [1, 2, 3, 10, 11, 12, 13, 20, 21, 30]]
+
+
+class FakeLDAPServer:
+
+    """Replica serving RECORDS with paged results of two entries."""
+
+    def __init__(self, fail_on_page=None, error=ldap.SERVER_DOWN):
+        """Initialize the server.
+
+        :param int fail_on_page: raise error when this page (1-based, counted
+            over all searches) is fetched, and for every request after it
+        :param class error: exception raised by a failed server
+        """
+        self.fail_on_page = fail_on_page
+        self.error = error
+        self.probe_error = None
+        self.down = False
+        self.pages = 0
+        self.searches = []
+
+    def connect(self):
+        """Return a new connection to this server."""
+        return FakeLDAPConnection(self)
+
+    def match(self, searchfilter):
+        """Return the records matching a partition of the search filter."""
+        if "(!(" in searchfilter:
+            return [r for r in RECORDS if r[1]["employeeID"][0][0] != "1"]
+        if "(employeeID=1*)" in searchfilter:
+            return [r for r in RECORDS if r[1]["employeeID"][0][0] == "1"]
+        return RECORDS
+
+
+class FakeLDAPConnection:
+
+    """Connection to a FakeLDAPServer."""
+
+    def __init__(self, server):
+        self.server = server
+        self.requests = {}
+
+    def set_option(self, option, value):
+        pass
+
+    def unbind_s(self):
+        pass
+
+    def search_s(self, base, scope, searchfilter, attrlist=None):
+        if self.server.probe_error:
+            raise self.server.probe_error("probe failed")
+        if self.server.down:
+            raise self.server.error("down")
+        return []
+
+    def search_ext(self, base, scope, searchfilter, attrlist=None,
+                   attrsonly=0, serverctrls=None):
+        if self.server.down:
+            raise self.server.error("down")
+        if not serverctrls[0].cookie:
+            self.server.searches.append(searchfilter)
+        msgid = len(self.requests) + 1
+        self.requests[msgid] = (searchfilter, serverctrls[0].cookie)
+        return msgid
+
+    def result3(self, msgid):
+        self.server.pages += 1
+        if self.server.pages == self.server.fail_on_page:
+            self.server.down = True
+        if self.server.down:
+            raise self.server.error("down")
+
+        searchfilter, cookie = self.requests[msgid]
+        records = self.server.match(searchfilter)
+        start = int(cookie or 0)
+        end = start + 2
+        next_cookie = str(end) if end < len(records) else ""
+        ctrl = SimplePagedResultsControl(True, 2, next_cookie)
+        return 101, records[start:end], msgid, [ctrl]
+
+
+class TestFailover(unittest.TestCase):
+
+    """Test searches over replicas with a server failing during the run."""
+
+    def setUp(self):
+        # Replica A fails on the second page of the second partition
+        self.servers = {
+            URI_A: FakeLDAPServer(fail_on_page=4),
+            URI_B: FakeLDAPServer()}
+        # Replica A is the fastest, so it is used first
+        self.health = OrderedDict([
+            (URI_A, {"latency": 0.001, "down_until": 0}),
+            (URI_B, {"latency": 0.002, "down_until": 0})])
+        # Keep the latencies fixed, except for testing the probe
+        self.probe_servers = myldap._probe_servers
+
+        patches = [
+            mock.patch.object(myldap, "_servers", self.health),
+            mock.patch.object(myldap, "_probe_servers"),
+            mock.patch.object(
+                myldap.ldap, "initialize",
+                side_effect=lambda uri: self.servers[uri].connect())]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _search(self, partitions, parallel=False):
+        with mock.patch.object(
+                myldap, "CFG_CERN_LDAP_PARTITIONS", partitions):
+            return myldap.get_users_records_data(
+                "(objectClass=*)", ["employeeID"], parallel=parallel)
+
+    def _assert_complete(self, records):
+        employee_ids = [r["employeeID"][0] for r in records]
+        self.assertEqual(len(employee_ids), len(set(employee_ids)))
+        self.assertEqual(
+            sorted(employee_ids),
+            sorted(r[1]["employeeID"][0] for r in RECORDS))
+
+    def test_failover_partitioned(self):
+        """Only the failed partition is repeated on the other replica."""
+        filters = myldap._partition_filters(
+            "(objectClass=*)", ["(employeeID=1*)"])
+        records = self._search(["(employeeID=1*)"])
+
+        self._assert_complete(records)
+        self.assertTrue(myldap._is_down(URI_A))
+        # The first partition finished on A and is not fetched again
+        self.assertEqual(self.servers[URI_A].searches, filters)
+        self.assertEqual(self.servers[URI_B].searches, filters[1:])
+
+    def test_failover_single_search(self):
+        """Without partitions, the search is repeated on the other replica."""
+        self.servers[URI_A].fail_on_page = 2
+        records = self._search([])
+
+        self._assert_complete(records)
+        self.assertEqual(self.servers[URI_B].searches, ["(objectClass=*)"])
+
+    def test_failover_busy(self):
+        """A busy replica fails over like a replica which is down."""
+        self.servers[URI_A].error = ldap.BUSY
+        records = self._search(["(employeeID=1*)"])
+
+        self._assert_complete(records)
+        self.assertTrue(myldap._is_down(URI_A))
+
+    def test_single_server(self):
+        """A single server without parallel is searched once."""
+        del self.health[URI_B]
+        self.servers[URI_A].fail_on_page = None
+        records = self._search(["(employeeID=1*)"])
+
+        self._assert_complete(records)
+        self.assertEqual(self.servers[URI_A].searches, ["(objectClass=*)"])
+
+    def test_probe_error(self):
+        """A replica failing the probe is marked down, not raised."""
+        self.servers[URI_A].probe_error = ldap.INSUFFICIENT_ACCESS
+        self.servers[URI_A].fail_on_page = None
+        self.probe_servers()
+
+        self.assertTrue(myldap._is_down(URI_A))
+        self.assertFalse(myldap._is_down(URI_B))
+        self.assertEqual(myldap._ranked_uris(), [URI_B, URI_A])
+
+    def test_parallel_spreads_partitions(self):
+        """Partitions start on different replicas in parallel mode."""
+        self.servers[URI_A].fail_on_page = None
+        records = self._search(["(employeeID=1*)"], parallel=True)
+
+        self._assert_complete(records)
+        self.assertEqual(len(self.servers[URI_A].searches), 1)
+        self.assertEqual(len(self.servers[URI_B].searches), 1)
+
+    def test_all_servers_down(self):
+        """LDAPError is raised if no replica answers."""
+        self.servers[URI_A].down = True
+        self.servers[URI_B].down = True
+
+        self.assertRaises(myldap.LDAPError, self._search, [])
+
+
+class TestPartitionFilters(unittest.TestCase):
+
+    """Test splitting the search filter by partitions."""
+
+    def test_catch_all(self):
+        """The records outside of all partitions are covered."""
+        self.assertEqual(
+            myldap._partition_filters("(a=1)", ["(b=1)", "(b=2)"]),
+            ["(&(a=1)(b=1))", "(&(a=1)(b=2))",
+             "(&(a=1)(!(|(b=1)(b=2))))"])
+
+    def test_no_partitions(self):
+        """The search filter is used unchanged without partitions."""
+        self.assertEqual(myldap._partition_filters("(a=1)", []), ["(a=1)"])
+
+
+if __name__ == "__main__":
+    unittest.main()
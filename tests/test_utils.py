@@ -0,0 +1,44 @@
+import unittest
+
+from utils import diff_attributes, diff_records
+
+RECORD = {
+    "employeeID": [u"123456"],
+    "sn": [u"Doe"],
+    "telephoneNumber": [u"71234"],
+    "mobile": [u"4111234"]}
+
+
+class TestDiffRecords(unittest.TestCase):
+
+    """Test classifying updated records."""
+
+    def test_diff_attributes(self):
+        """Changed, added, and removed attributes are returned."""
+        record_new = dict(RECORD, telephoneNumber=[u"75678"], mail=[u"x"])
+        del record_new["mobile"]
+
+        self.assertEqual(
+            diff_attributes(record_new, RECORD),
+            ["mail", "mobile", "telephoneNumber"])
+
+    def test_delta(self):
+        """Changed records contain the changed attributes if delta."""
+        record_new = dict(RECORD, telephoneNumber=[u"75678"])
+        record_add = dict(RECORD, employeeID=[u"654321"])
+
+        self.assertEqual(
+            sorted(diff_records([record_new, record_add], [RECORD], True)),
+            sorted([("change", record_new, ["telephoneNumber"]),
+                    ("add", record_add)]))
+        self.assertEqual(
+            diff_records([record_new], [RECORD]), [("change", record_new)])
+
+    def test_removed(self):
+        """Records missing on LDAP are classified as removed."""
+        self.assertEqual(diff_records([], [RECORD], True),
+                         [("remove", RECORD)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -31,7 +31,20 @@ def get_data_from_json(json_file):
             "Error: failed opening file '{0}'. ({1})".format(json_file, e))
 
 
-def diff_records(records_ldap, records_local):
+def diff_attributes(record_new, record_old):
+    """Compare the attributes of two versions of the same record.
+
+    :param dictionary record_new: current LDAP record
+    :param dictionary record_old: previous LDAP record
+    :return: sorted list of attribute names which were changed, added, or
+        removed
+    """
+    attr_keys = set(record_new.keys()) | set(record_old.keys())
+    return sorted(
+        k for k in attr_keys if record_new.get(k) != record_old.get(k))
+
+
+def diff_records(records_ldap, records_local, delta=False):
     """Compare records with same employeeID.
 
     Records are classified in three classes: changed ('change'), new
@@ -40,6 +53,8 @@ def diff_records(records_ldap, records_local):
     :param list records_ldap: fetched CERN LDAP records
     :param list records_local: previous fetched CERN LDAP records,
     saved as a JSON file
+    :param bool delta: for changed records, add the list of changed
+        attributes as third element (tuple: ('change', record, attr_keys))
     :return: list of updated records (tuple: (status, record)), where
        status = 'change', 'add', or 'remove', or empty list
     """
@@ -54,9 +69,16 @@ def diff_records(records_ldap, records_local):
         for employee_id in dict_ldap.iterkeys():
             record = dict_ldap.get(employee_id)
             if employee_id in dict_local:
-                if not record == dict_local.get(employee_id):
+                record_local = dict_local.get(employee_id)
+                if not record == record_local:
                     # Changed record
-                    results.append(('change', record))
+                    if delta:
+                        results.append((
+                            'change',
+                            record,
+                            diff_attributes(record, record_local)))
+                    else:
+                        results.append(('change', record))
             else:
                 # New record
                 results.append(('add', record))